@@ -0,0 +1,638 @@
+"""
+Benchmark + load-test suite for the signing engine.
+
+    python bench.py micro  --lines 1,10,100 --out bench.json
+    python bench.py load   --requests 500 --tenants test-key-123:3,client-key-456:1
+    python bench.py memory --requests 5000 --sample-every 500
+    python bench.py startup --runs 5 --warm
+    python bench.py compare bench_baseline.json bench.json --tolerance 0.15
+
+كل الأوامر تطبع JSON (أو تكتبه في --out) عشان نقارنه مع baseline محفوظ.
+"""
+import argparse
+import gc
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+SCHEMA_VERSION = 1
+
+# أسماء Latin-1 بس: pdf_generator يستخدم Arial core font وما يدعم الحروف العربية
+SELLERS = [
+    ("Mutabiq Trading Co.", "300000000000003"),
+    ("Al Mithal Trading Est.", "310122393500003"),
+    ("Najd Supplies LLC", "302211445500003"),
+]
+BUYERS = [
+    ("Acme Retail", "311111111100003"),
+    ("Al Ameel Establishment", "399999999900003"),
+    ("Gulf Logistics", "301234567800003"),
+]
+
+
+# ===============================
+# 1) SYNTHETIC INVOICES
+# ===============================
+def make_invoice_payload(lines=1, seed=None):
+    """
+    Invoice JSON بنفس شكل body حق /sign_invoice، بعدد سطور محدد.
+    نفس الـ seed يعطي نفس الفاتورة (عدا InvoiceNumber/UUID لو seed=None).
+    """
+    rnd = random.Random(seed)
+    seller_name, seller_vat = rnd.choice(SELLERS)
+    buyer_name, buyer_vat = rnd.choice(BUYERS)
+
+    items = []
+    for i in range(lines):
+        items.append({
+            "Description": f"Item {i + 1}",
+            "Quantity": rnd.randint(1, 20),
+            "UnitPrice": round(rnd.uniform(1, 500), 2),
+            "VATRate": 15,
+        })
+
+    ident = str(uuid.UUID(int=rnd.getrandbits(128))) if seed is not None else str(uuid.uuid4())
+    return {
+        "InvoiceNumber": f"INV-{ident[:8]}",
+        "UUID": ident,
+        "IssueDate": "2024-01-15",
+        "Currency": "SAR",
+        "SellerName": seller_name,
+        "SellerVAT": seller_vat,
+        "BuyerName": buyer_name,
+        "BuyerVAT": buyer_vat,
+        "Items": items,
+    }
+
+
+def parse_tenant_mix(spec):
+    """
+    "test-key-123:3,client-key-456:1" -> [("test-key-123", 3.0), ("client-key-456", 1.0)]
+    """
+    mix = []
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        key, _, weight = part.partition(":")
+        mix.append((key, float(weight or 1)))
+    return mix
+
+
+def _parse_lines(spec):
+    return [int(x) for x in spec.split(",") if x.strip()]
+
+
+# ===============================
+# 2) HELPERS
+# ===============================
+def percentile(samples, pct):
+    """
+    Nearest-rank percentile على قائمة أرقام (بالثواني أو أي وحدة).
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = max(math.ceil(pct / 100.0 * len(ordered)) - 1, 0)
+    return ordered[min(k, len(ordered) - 1)]
+
+
+def summarize(samples):
+    samples_ms = [s * 1000.0 for s in samples]
+    return {
+        "n": len(samples_ms),
+        "mean_ms": round(statistics.fmean(samples_ms), 4) if samples_ms else 0.0,
+        "p50_ms": round(percentile(samples_ms, 50), 4),
+        "p95_ms": round(percentile(samples_ms, 95), 4),
+        "p99_ms": round(percentile(samples_ms, 99), 4),
+        "max_ms": round(max(samples_ms), 4) if samples_ms else 0.0,
+    }
+
+
+def time_call(fn, repeat, warmup=1):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def ensure_private_key():
+    """
+    sign_xml يقرأ PRIVATE_KEY من env. لو مو موجود نولّد مفتاح RSA مؤقت للـ benchmark فقط.
+    """
+    if os.environ.get("PRIVATE_KEY"):
+        return
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    os.environ["PRIVATE_KEY"] = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode("utf-8")
+
+
+def environment_info():
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def emit(report, out):
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+# ===============================
+# 3) MICRO BENCHMARKS
+# ===============================
+def run_micro(args):
+    from invoice_builder import build_invoice_xml
+    from validator import validate_invoice_xml
+
+    ensure_private_key()
+    from signer import sign_xml
+    from pdf_generator import generate_pdf_from_xml
+
+    results = {}
+    # PDF يكتب invoice.pdf في الـ cwd، نشغله داخل مجلد مؤقت
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            for n in _parse_lines(args.lines):
+                payload = make_invoice_payload(n, seed=args.seed)
+                invoice_xml = build_invoice_xml(payload)
+                signed = sign_xml(invoice_xml)
+
+                results[f"lines={n}"] = {
+                    "build_invoice_xml": summarize(time_call(lambda: build_invoice_xml(payload), args.repeat)),
+                    "validate_invoice_xml": summarize(time_call(lambda: validate_invoice_xml(invoice_xml), args.repeat)),
+                    "validate_signed_xml": summarize(time_call(lambda: validate_invoice_xml(signed), args.repeat)),
+                    "sign_xml": summarize(time_call(lambda: sign_xml(invoice_xml), args.repeat)),
+                    "generate_pdf_from_xml": summarize(time_call(lambda: generate_pdf_from_xml(invoice_xml), args.repeat)),
+                    "xml_bytes": len(invoice_xml.encode("utf-8")),
+                }
+        finally:
+            os.chdir(cwd)
+
+    return {"kind": "micro", "repeat": args.repeat, "seed": args.seed, "results": results}
+
+
+# ===============================
+# 4) END-TO-END LOAD
+# ===============================
+def _prepare_app(unlimited=True):
+    ensure_private_key()
+    # validation cache بالذاكرة بس: ما نكتب صفوف وهمية في store الإنتاج ولا نحسب I/O القرص في الـ latency
+    os.environ["VALIDATION_CACHE_PATH"] = ""
+    import main
+
+    # الأنظمة التقيلة lazy؛ نحملها قبل tracemalloc وقبل التوقيت عشان الـ imports ما تنحسب
+    # كـ "نمو" في الـ stores ولا تدخل في p99/max (cold start يقيسه أمر startup)
+    main.warm_up()
+
+    if unlimited:
+        # الـ load test يقيس الخدمة مو الـ limiter
+        for client in main.API_CLIENTS.values():
+            client["rate_limit_per_min"] = 10 ** 9
+    return main
+
+
+def _reset_stores(main):
+    main.USAGE_LOGS.clear()
+    main.RATE_BUCKET.clear()
+    main.INVOICE_FINGERPRINTS.clear()
+    main.VALIDATION_CACHE.clear()
+
+
+class _HttpClient:
+    """
+    نفس واجهة Flask test client (post/get) لكن على سيرفر حقيقي عبر --url.
+    """
+    class _Resp:
+        def __init__(self, status_code, data):
+            self.status_code = status_code
+            self.data = data
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    def _send(self, method, path, headers=None, data=None, json_body=None):
+        import urllib.error
+        import urllib.request
+
+        headers = dict(headers or {})
+        if json_body is not None:
+            data = json.dumps(json_body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        elif isinstance(data, str):
+            data = data.encode("utf-8")
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(req) as resp:
+                return self._Resp(resp.status, resp.read())
+        except urllib.error.HTTPError as e:
+            return self._Resp(e.code, e.read())
+
+    def get(self, path, headers=None):
+        return self._send("GET", path, headers=headers)
+
+    def post(self, path, headers=None, data=None, json=None):
+        return self._send("POST", path, headers=headers, data=data, json_body=json)
+
+
+def _pick_tenant(rnd, mix):
+    keys = [k for k, _ in mix]
+    weights = [w for _, w in mix]
+    return rnd.choices(keys, weights=weights, k=1)[0]
+
+
+def drive_load(client, requests_count, lines_choices, mix, seed=0, on_request=None):
+    """
+    يرسل requests_count طلب موزعة على كل الـ endpoints.
+    يرجع latencies (للردود 2xx بس، عشان الأخطاء السريعة ما تخرب الـ percentiles) + عدد كل status.
+    كل فاتورة seed حقها من rnd: نفس --seed = نفس الطلبات، و UUIDs مختلفة (ما فيه 409).
+    """
+    from invoice_builder import build_invoice_xml
+
+    rnd = random.Random(seed)
+    latencies = {}
+    statuses = {}
+    endpoints = ["/sign_invoice", "/validate_invoice", "/generate_pdf", "/"]
+
+    for i in range(requests_count):
+        endpoint = endpoints[i % len(endpoints)]
+        api_key = _pick_tenant(rnd, mix)
+        headers = {"x-api-key": api_key}
+        payload = make_invoice_payload(rnd.choice(lines_choices), seed=rnd.getrandbits(64))
+
+        t0 = time.perf_counter()
+        if endpoint == "/sign_invoice":
+            resp = client.post(endpoint, headers=headers, json=payload)
+        elif endpoint == "/":
+            resp = client.get(endpoint)
+        else:
+            resp = client.post(endpoint, headers=headers, data=build_invoice_xml(payload))
+        elapsed = time.perf_counter() - t0
+
+        samples = latencies.setdefault(endpoint, [])
+        if 200 <= resp.status_code < 300:
+            samples.append(elapsed)
+        key = f"{endpoint}:{resp.status_code}"
+        statuses[key] = statuses.get(key, 0) + 1
+
+        if on_request:
+            on_request(i + 1)
+
+    return latencies, statuses
+
+
+def _error_rate(statuses, endpoint=None):
+    total = errors = 0
+    for key, count in statuses.items():
+        ep, _, code = key.rpartition(":")
+        if endpoint is not None and ep != endpoint:
+            continue
+        total += count
+        if not 200 <= int(code) < 300:
+            errors += count
+    return round(errors / total, 4) if total else 0.0
+
+
+def run_load(args):
+    mix = parse_tenant_mix(args.tenants)
+    lines_choices = _parse_lines(args.lines)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.url:
+            client = _HttpClient(args.url)
+        else:
+            main = _prepare_app()
+            _reset_stores(main)
+            client = main.app.test_client()
+            os.chdir(tmp)
+        try:
+            t0 = time.perf_counter()
+            latencies, statuses = drive_load(client, args.requests, lines_choices, mix, seed=args.seed)
+            wall = time.perf_counter() - t0
+        finally:
+            os.chdir(cwd)
+
+    all_samples = [s for samples in latencies.values() for s in samples]
+    return {
+        "kind": "load",
+        "target": args.url or "flask-test-client",
+        "requests": args.requests,
+        "tenants": dict(mix),
+        "lines": lines_choices,
+        "wall_seconds": round(wall, 4),
+        "throughput_rps": round(args.requests / wall, 2) if wall else 0.0,
+        "overall": dict(summarize(all_samples), error_rate=_error_rate(statuses)),
+        "endpoints": {
+            ep: dict(summarize(samples), error_rate=_error_rate(statuses, ep))
+            for ep, samples in latencies.items()
+        },
+        "status_counts": statuses,
+    }
+
+
+# ===============================
+# 5) MEMORY OF GLOBAL STORES
+# ===============================
+def _store_sizes(main):
+    cache = main.VALIDATION_CACHE.stats()
+    return {
+        "usage_logs": len(main.USAGE_LOGS),
+        "rate_bucket_clients": len(main.RATE_BUCKET),
+        "rate_bucket_entries": sum(len(b) for b in main.RATE_BUCKET.values()),
+        "fingerprint_clients": len(main.INVOICE_FINGERPRINTS),
+        "fingerprint_entries": sum(len(s) for s in main.INVOICE_FINGERPRINTS.values()),
+        "validation_cache_entries": len(main.VALIDATION_CACHE._lru),
+        "validation_cache_hits": cache["hits_memory"] + cache["hits_disk"],
+        "validation_cache_misses": cache["misses"],
+        "validation_cache_evictions": cache["evictions"],
+    }
+
+
+def run_memory(args):
+    mix = parse_tenant_mix(args.tenants)
+    lines_choices = _parse_lines(args.lines)
+    main = _prepare_app()
+    _reset_stores(main)
+    client = main.app.test_client()
+
+    samples = []
+
+    def on_request(i):
+        if i % args.sample_every == 0 or i == args.requests:
+            gc.collect()
+            current, peak = tracemalloc.get_traced_memory()
+            row = {"requests": i, "traced_kib": round(current / 1024, 1), "peak_kib": round(peak / 1024, 1)}
+            row.update(_store_sizes(main))
+            samples.append(row)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        tracemalloc.start()
+        try:
+            gc.collect()
+            base, _ = tracemalloc.get_traced_memory()
+            drive_load(client, args.requests, lines_choices, mix, seed=args.seed, on_request=on_request)
+        finally:
+            tracemalloc.stop()
+            os.chdir(cwd)
+
+    growth = (samples[-1]["traced_kib"] - base / 1024) if samples else 0.0
+    return {
+        "kind": "memory",
+        "requests": args.requests,
+        "baseline_kib": round(base / 1024, 1),
+        "growth_kib": round(growth, 1),
+        "growth_bytes_per_request": round(growth * 1024 / args.requests, 1) if args.requests else 0.0,
+        "samples": samples,
+    }
+
+
+# ===============================
+# 6) STARTUP (cold import + first request)
+# ===============================
+HEAVY_MODULES = ("signxml", "lxml", "cryptography", "fpdf")
+
+# يشتغل في process جديد كل مرة عشان نقيس cold start فعلاً
+_STARTUP_SCRIPT = r"""
+import json, os, sys, time
+sys.path.insert(0, sys.argv[1])
+warm = sys.argv[2] == "1"
+
+t0 = time.perf_counter()
+import main
+import_s = time.perf_counter() - t0
+
+heavy_after_import = [m for m in %(heavy)r if m in sys.modules]
+
+warm_s = 0.0
+if warm:
+    t0 = time.perf_counter()
+    main.warm_up()
+    warm_s = time.perf_counter() - t0
+
+import bench
+from invoice_builder import build_invoice_xml
+
+os.chdir(sys.argv[3])
+client = main.app.test_client()
+headers = {"x-api-key": "client-key-456"}
+payload = bench.make_invoice_payload(5, seed=int(sys.argv[4]))
+xml = build_invoice_xml(payload)
+
+first = {}
+for endpoint in ("/validate_invoice", "/sign_invoice", "/generate_pdf"):
+    t0 = time.perf_counter()
+    if endpoint == "/sign_invoice":
+        resp = client.post(endpoint, headers=headers, json=payload)
+    else:
+        resp = client.post(endpoint, headers=headers, data=xml)
+    first[endpoint] = {"seconds": time.perf_counter() - t0, "status": resp.status_code}
+
+print(json.dumps({
+    "import_s": import_s,
+    "warm_s": warm_s,
+    "heavy_after_import": heavy_after_import,
+    "first_request": first,
+}))
+""" % {"heavy": HEAVY_MODULES}
+
+
+def run_startup(args):
+    ensure_private_key()
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, VALIDATION_CACHE_PATH="")
+
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(args.runs):
+            t0 = time.perf_counter()
+            out = subprocess.run(
+                [sys.executable, "-c", _STARTUP_SCRIPT, here, "1" if args.warm else "0", tmp, str(args.seed + i)],
+                env=env, cwd=here, capture_output=True, text=True, check=True,
+            )
+            row = json.loads(out.stdout.strip().splitlines()[-1])
+            row["process_s"] = time.perf_counter() - t0
+
+            # first-request latency لرد خطأ ما له معنى؛ نوقف بدل ما نطلع رقم مضلل
+            failed = {ep: r["status"] for ep, r in row["first_request"].items() if not 200 <= r["status"] < 300}
+            if failed:
+                raise RuntimeError(f"startup run {i + 1}: non-2xx first responses {failed}")
+            runs.append(row)
+
+    endpoints = runs[0]["first_request"].keys() if runs else []
+    return {
+        "kind": "startup",
+        "runs": args.runs,
+        "warm": args.warm,
+        "heavy_modules_after_import": runs[0]["heavy_after_import"] if runs else [],
+        "import": summarize([r["import_s"] for r in runs]),
+        "warm_up": summarize([r["warm_s"] for r in runs]),
+        "process_total": summarize([r["process_s"] for r in runs]),
+        "first_request": {
+            ep: dict(summarize([r["first_request"][ep]["seconds"] for r in runs]),
+                     status=runs[0]["first_request"][ep]["status"])
+            for ep in endpoints
+        },
+    }
+
+
+# ===============================
+# 7) COMPARE AGAINST BASELINE
+# ===============================
+def _flatten(obj, prefix=""):
+    flat = {}
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            flat.update(_flatten(v, f"{prefix}{k}."))
+    elif isinstance(obj, (int, float)) and not isinstance(obj, bool):
+        flat[prefix[:-1]] = obj
+    return flat
+
+
+# المقاييس اللي "الأعلى أسوأ"؛ throughput العكس
+_LOWER_IS_BETTER = ("_ms", "_kib", "bytes_per_request", "wall_seconds", "error_rate")
+_HIGHER_IS_BETTER = ("throughput_rps",)
+
+
+def compare_reports(baseline, current, tolerance=0.10):
+    """
+    يرجع قائمة regressions: أي مقياس ساء بأكثر من tolerance (نسبة).
+    """
+    base_flat = _flatten(baseline)
+    cur_flat = _flatten(current)
+    regressions = []
+
+    for key, base_val in base_flat.items():
+        if key not in cur_flat or not base_val:
+            continue
+        cur_val = cur_flat[key]
+        change = (cur_val - base_val) / abs(base_val)
+
+        if key.endswith(_HIGHER_IS_BETTER):
+            worse = change < -tolerance
+        elif key.endswith(_LOWER_IS_BETTER):
+            worse = change > tolerance
+        else:
+            continue
+
+        if worse:
+            regressions.append({
+                "metric": key,
+                "baseline": base_val,
+                "current": cur_val,
+                "change_pct": round(change * 100, 1),
+            })
+    return regressions
+
+
+def run_compare(args):
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+
+    regressions = compare_reports(baseline, current, args.tolerance)
+    return {
+        "kind": "compare",
+        "tolerance": args.tolerance,
+        "regressions": regressions,
+        "ok": not regressions,
+    }
+
+
+# ===============================
+# CLI
+# ===============================
+def build_parser():
+    parser = argparse.ArgumentParser(description="Mutabiq signing engine benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def common(p):
+        p.add_argument("--lines", default="1,10,100", help="comma separated line counts")
+        p.add_argument("--seed", type=int, default=1234)
+        p.add_argument("--out", help="write JSON report to this file")
+
+    p = sub.add_parser("micro", help="per-module micro benchmarks")
+    common(p)
+    p.add_argument("--repeat", type=int, default=50)
+
+    p = sub.add_parser("load", help="end-to-end load against the Flask app")
+    common(p)
+    p.add_argument("--requests", type=int, default=400)
+    p.add_argument("--tenants", default="test-key-123:1,client-key-456:1")
+    p.add_argument("--url", help="hit a running server instead of the in-process test client")
+
+    p = sub.add_parser("memory", help="memory growth of the in-memory stores")
+    common(p)
+    p.add_argument("--requests", type=int, default=2000)
+    p.add_argument("--sample-every", type=int, default=250)
+    p.add_argument("--tenants", default="test-key-123:1,client-key-456:1")
+
+    p = sub.add_parser("startup", help="cold import time and first-request latency in fresh processes")
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("--warm", action="store_true", help="call main.warm_up() before the first request (preload mode)")
+    p.add_argument("--seed", type=int, default=1234)
+    p.add_argument("--out")
+
+    p = sub.add_parser("compare", help="compare a report against a stored baseline")
+    p.add_argument("baseline")
+    p.add_argument("current")
+    p.add_argument("--tolerance", type=float, default=0.10)
+    p.add_argument("--out")
+
+    return parser
+
+
+RUNNERS = {
+    "micro": run_micro,
+    "load": run_load,
+    "memory": run_memory,
+    "startup": run_startup,
+    "compare": run_compare,
+}
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    report = RUNNERS[args.command](args)
+    if args.command != "compare":
+        report["schema_version"] = SCHEMA_VERSION
+        report["env"] = environment_info()
+    emit(report, args.out)
+    if args.command == "compare" and not report["ok"]:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
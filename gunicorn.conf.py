@@ -0,0 +1,23 @@
+# gunicorn يقرأ هذا الملف تلقائياً من مجلد التشغيل:
+#   gunicorn main:app            -> lazy: كل worker يحمل signxml/fpdf أول ما يحتاجها
+#   gunicorn --preload main:app  -> الـ master يحمل ويسخن كل شي مرة وحدة قبل الـ fork
+#   PRELOAD=1 gunicorn main:app  -> نفس الشي (PRELOAD يغير الـ default بس؛ الـ CLI يغلب)
+import gc
+import os
+
+preload_app = os.environ.get("PRELOAD", "0") == "1"
+
+
+def when_ready(server):
+    # ينادى في الـ master بعد تحميل التطبيق وقبل ما يبدأ الـ fork
+    # server.cfg فيه القيمة النهائية بعد الـ CLI (--preload يغلب الملف)
+    if not server.cfg.preload_app:
+        return
+
+    import main
+    main.warm_up()
+
+    # نخلي الـ objects الموجودة خارج الـ GC عشان ما يلمس صفحاتها في الـ workers (يحافظ على copy-on-write)
+    gc.collect()
+    gc.freeze()
+    server.log.info("Preloaded signer, private key, fpdf and OpenAPI spec in master")
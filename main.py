@@ -1,12 +1,16 @@
-from flask import Flask, request, jsonify
-from signer import sign_xml
+from flask import Flask, request, jsonify, g, send_file
+from signer import sign_xml, warm_signer
 from invoice_builder import build_invoice_xml
-from validator import validate_invoice_xml
-from pdf_generator import generate_pdf_from_xml
+from validator import RULE_SETS
+from validation_cache import VALIDATION_CACHE, validate_invoice_bytes
+from rule_engine import rule_stats
+from pdf_generator import generate_pdf_from_xml, warm_pdf
+import profiler
 import os
 import time
 import hashlib
 from collections import defaultdict, deque
+from contextlib import nullcontext
 
 app = Flask(__name__)
 
@@ -30,7 +34,7 @@ API_CLIENTS = {
         "name": "second-client",
         "plan": "pro",
         "status": "active",
-        "features": {"sign_invoice", "validate_invoice", "generate_pdf", "audit"},
+        "features": {"sign_invoice", "validate_invoice", "generate_pdf", "audit", "profile"},
         "rate_limit_per_min": 600,  # requests/min
     },
 }
@@ -137,6 +141,44 @@ def duplicate_check(client_id: str, fp: str):
     INVOICE_FINGERPRINTS[client_id].add(fp)
     return False
 
+def profiled(client, endpoint):
+    # Opt-in cProfile حول جسم الطلب (X-Profile: 1 + PROFILING_ENABLED=1 + ميزة profile)
+    if not profiler.wants_profile(request.headers, client):
+        return nullcontext()
+    return profiler.profile_request(request.headers, client, endpoint, g.setdefault("profile_state", {}))
+
+@app.after_request
+def attach_profile_headers(response):
+    state = g.get("profile_state")
+    if state:
+        response.headers["X-Profile-Status"] = state.get("profile_status", "")
+        if state.get("profile_id"):
+            response.headers["X-Profile-Id"] = state["profile_id"]
+    return response
+
+_OPENAPI_SPEC = None
+
+def _openapi_spec():
+    global _OPENAPI_SPEC
+    if _OPENAPI_SPEC is None:
+        with open("openapi.json", "r") as f:
+            _OPENAPI_SPEC = f.read()
+    return _OPENAPI_SPEC
+
+def warm_up():
+    """
+    يحمل الأنظمة التقيلة (signxml/lxml/cryptography + المفتاح، import fpdf، openapi.json).
+    بدونه كل شي lazy على أول طلب؛ مع gunicorn --preload ينادى مرة وحدة في الـ master
+    والـ workers ياخذونه copy-on-write (شوف gunicorn.conf.py).
+    """
+    warm_signer()
+    warm_pdf()
+    try:
+        _openapi_spec()
+    except OSError:
+        # ما نوقف الـ master عشان ملف docs؛ /openapi.json يرجع 500 زي قبل
+        pass
+
 # ===============================
 # 0) Health Check (بدون API)
 # ===============================
@@ -167,33 +209,34 @@ def sign_invoice():
         log_usage(client, "/sign_invoice", 403)
         return feat_error
 
-    try:
-        data = request.get_json(force=True)
-        invoice_xml = build_invoice_xml(data)
-
-        # Fingerprint + Duplicate protection
-        fp = fingerprint_invoice(client["client_id"], invoice_xml)
-        if duplicate_check(client["client_id"], fp):
-            log_usage(client, "/sign_invoice", 409, {"fingerprint": fp})
-            return jsonify({
-                "status": "error",
-                "message": "Duplicate invoice detected",
-                "fingerprint": fp
-            }), 409
+    with profiled(client, "/sign_invoice"):
+        try:
+            data = request.get_json(force=True)
+            invoice_xml = build_invoice_xml(data)
 
-        signed = sign_xml(invoice_xml)
+            # Fingerprint + Duplicate protection
+            fp = fingerprint_invoice(client["client_id"], invoice_xml)
+            if duplicate_check(client["client_id"], fp):
+                log_usage(client, "/sign_invoice", 409, {"fingerprint": fp})
+                return jsonify({
+                    "status": "error",
+                    "message": "Duplicate invoice detected",
+                    "fingerprint": fp
+                }), 409
 
-        log_usage(client, "/sign_invoice", 200, {"fingerprint": fp})
+            signed = sign_xml(invoice_xml)
 
-        return success_response(client, {
-            "invoice_xml": invoice_xml,
-            "signed_xml": signed,
-            "fingerprint": fp
-        })
+            log_usage(client, "/sign_invoice", 200, {"fingerprint": fp})
 
-    except Exception as e:
-        log_usage(client, "/sign_invoice", 500, {"error": str(e)})
-        return error_response(client, str(e), 500, "SIGN_ERROR")
+            return success_response(client, {
+                "invoice_xml": invoice_xml,
+                "signed_xml": signed,
+                "fingerprint": fp
+            })
+
+        except Exception as e:
+            log_usage(client, "/sign_invoice", 500, {"error": str(e)})
+            return error_response(client, str(e), 500, "SIGN_ERROR")
 
 # ===============================
 # 2) Validate XML
@@ -214,26 +257,29 @@ def validate_invoice():
         log_usage(client, "/validate_invoice", 403)
         return feat_error
 
-    try:
-        xml_input = request.data.decode("utf-8")
-        result = validate_invoice_xml(xml_input)
+    with profiled(client, "/validate_invoice"):
+        try:
+            # نفس الـ XML يتكرر كثير (قبل الإرسال، بعد PDF، audit) -> cache على sha256 للـ body
+            result, cache_hit = validate_invoice_bytes(request.get_data())
 
-        log_usage(client, "/validate_invoice", 200, {"is_valid": bool(result.get("is_valid", False))})
+            log_usage(client, "/validate_invoice", 200, {
+                "is_valid": bool(result.get("is_valid", False)),
+                "cache_hit": cache_hit
+            })
 
-        # normalize response
-        return success_response(client, result)
+            # normalize response
+            return success_response(client, result)
 
-    except Exception as e:
-        log_usage(client, "/validate_invoice", 500, {"error": str(e)})
-        return error_response(client, str(e), 500, "VALIDATION_ERROR")
+        except Exception as e:
+            log_usage(client, "/validate_invoice", 500, {"error": str(e)})
+            return error_response(client, str(e), 500, "VALIDATION_ERROR")
 
 # ===============================
 # 3) OpenAPI Spec
 # ===============================
 @app.route("/openapi.json", methods=["GET"])
 def openapi():
-    with open("openapi.json", "r") as f:
-        return f.read(), 200, {"Content-Type": "application/json"}
+    return _openapi_spec(), 200, {"Content-Type": "application/json"}
 
 # ===============================
 # 4) Swagger Docs
@@ -282,17 +328,18 @@ def generate_pdf():
         log_usage(client, "/generate_pdf", 403)
         return feat_error
 
-    try:
-        xml_input = request.data.decode("utf-8")
-        filename = generate_pdf_from_xml(xml_input)
+    with profiled(client, "/generate_pdf"):
+        try:
+            xml_input = request.data.decode("utf-8")
+            filename = generate_pdf_from_xml(xml_input)
 
-        log_usage(client, "/generate_pdf", 200, {"pdf_file": filename})
+            log_usage(client, "/generate_pdf", 200, {"pdf_file": filename})
 
-        return success_response(client, {"pdf_file": filename})
+            return success_response(client, {"pdf_file": filename})
 
-    except Exception as e:
-        log_usage(client, "/generate_pdf", 500, {"error": str(e)})
-        return error_response(client, str(e), 500, "PDF_ERROR")
+        except Exception as e:
+            log_usage(client, "/generate_pdf", 500, {"error": str(e)})
+            return error_response(client, str(e), 500, "PDF_ERROR")
 
 # ===============================
 # 6) Admin: Usage Summary (Backend-only helper)
@@ -320,6 +367,61 @@ def usage_summary():
 
     return success_response(client, {"summary": dict(summary), "total_logs": len(USAGE_LOGS)})
 
+# ===============================
+# 6b) Admin: Validation rules + per-rule timing + cache stats
+# ===============================
+@app.route("/admin/validation_rules", methods=["GET"])
+def validation_rules():
+    client, auth_error = get_client_or_401()
+    if auth_error:
+        return auth_error
+
+    if client["plan"] != "pro":
+        return jsonify({"status": "error", "message": "Not allowed"}), 403
+
+    return success_response(client, {
+        "rule_sets": {name: rs.describe() for name, rs in RULE_SETS.items()},
+        "stats": rule_stats(),
+        "cache": VALIDATION_CACHE.stats()
+    })
+
+# ===============================
+# 7) Admin: Profiles (opt-in cProfile captures)
+# ===============================
+@app.route("/admin/profiles", methods=["GET"])
+def list_profiles():
+    client, auth_error = get_client_or_401()
+    if auth_error:
+        return auth_error
+
+    feat_error = require_feature(client, profiler.PROFILE_FEATURE)
+    if feat_error:
+        return feat_error
+
+    return success_response(client, {
+        "enabled": profiler.PROFILING_ENABLED,
+        "profiles": profiler.list_profiles(client["client_id"])
+    })
+
+@app.route("/admin/profiles/<name>", methods=["GET"])
+def download_profile(name):
+    client, auth_error = get_client_or_401()
+    if auth_error:
+        return auth_error
+
+    feat_error = require_feature(client, profiler.PROFILE_FEATURE)
+    if feat_error:
+        return feat_error
+
+    # كل عميل يشوف profiles حقته بس
+    owned = {row["name"] for row in profiler.list_profiles(client["client_id"])}
+    path = profiler.profile_path(name)
+    if not path or name not in owned:
+        return error_response(client, "Profile not found", 404, "NOT_FOUND")
+
+    # يفتح بـ: python -m pstats <file>  أو snakeviz
+    return send_file(path, mimetype="application/octet-stream", as_attachment=True, download_name=name)
+
 # ===============================
 # Run
 # ===============================
@@ -1,8 +1,22 @@
-from fpdf import FPDF
 import xml.etree.ElementTree as ET
 
+# fpdf يتحمل أول مرة نحتاجه (أو في warm_pdf)
+_FPDF = None
+
+def _fpdf():
+    global _FPDF
+    if _FPDF is None:
+        from fpdf import FPDF
+        _FPDF = FPDF
+    return _FPDF
+
+def warm_pdf():
+    # import fpdf بس؛ Arial core font (metrics مدمجة) ما يحتاج تحميل
+    _fpdf()
+
 def generate_pdf_from_xml(xml_content):
     try:
+        FPDF = _fpdf()
         root = ET.fromstring(xml_content)
 
         invoice_id = root.find(".//{*}ID").text if root.find(".//{*}ID") is not None else "N/A"
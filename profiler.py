@@ -0,0 +1,161 @@
+import cProfile
+import os
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+# ===============================
+# CONFIG (env)
+# ===============================
+# لازم يتفعل صراحة على مستوى السيرفر، وبعدها header لكل طلب
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "0") == "1"
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", 50))
+PROFILE_RATE_LIMIT = int(os.environ.get("PROFILE_RATE_LIMIT", 5))        # profiles per window per client
+PROFILE_RATE_WINDOW = int(os.environ.get("PROFILE_RATE_WINDOW", 600))    # seconds
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_FEATURE = "profile"
+
+# ===============================
+# STATE
+# ===============================
+# {client_id: deque[timestamps]} نفس فكرة RATE_BUCKET في main
+PROFILE_BUCKET = defaultdict(lambda: deque())
+
+# profiler واحد بس في نفس الوقت (cProfile ما يقبل أكثر من واحد شغال في 3.12+)
+_ACTIVE = threading.Lock()
+_BUCKET_LOCK = threading.Lock()
+
+_SAFE_NAME = re.compile(r"^[A-Za-z0-9_.-]+\.prof$")
+
+
+def wants_profile(headers, client):
+    """
+    أرخص فحص ممكن: لو الميزة مطفأة أو ما فيه header نرجع False بدون أي شغل ثاني.
+    """
+    if not PROFILING_ENABLED:
+        return False
+    if headers.get(PROFILE_HEADER) != "1":
+        return False
+    return PROFILE_FEATURE in client.get("features", set())
+
+
+def _allow(client_id):
+    now = time.time()
+    with _BUCKET_LOCK:
+        bucket = PROFILE_BUCKET[client_id]
+        while bucket and (now - bucket[0]) > PROFILE_RATE_WINDOW:
+            bucket.popleft()
+        if len(bucket) >= PROFILE_RATE_LIMIT:
+            return False
+        bucket.append(now)
+        return True
+
+
+def _prune(keep):
+    """
+    Ring على القرص: نخلي آخر PROFILE_MAX_FILES ملف فقط.
+    keep: الملف اللي انكتب للتو، ما ينحذف حتى لو تعادل في الـ ms مع غيره.
+    """
+    files = [row for row in list_profiles() if row["name"] != keep]
+    for row in files[max(PROFILE_MAX_FILES - 1, 0):]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, row["name"]))
+        except OSError:
+            pass
+
+
+def _save(prof, client_id, endpoint):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = endpoint.strip("/").replace("/", "_") or "root"
+    name = f"{int(time.time() * 1000)}--{client_id}--{slug}--{uuid.uuid4().hex[:8]}.prof"
+    prof.dump_stats(os.path.join(PROFILE_DIR, name))
+    _prune(keep=name)
+    return name
+
+
+@contextmanager
+def profile_request(headers, client, endpoint, state):
+    """
+    يشغل cProfile حول جسم الطلب (build/validate/sign/PDF) لو الطلب طلبه.
+    state: dict (عادةً flask.g) نحط فيه profile_id أو سبب الرفض.
+    """
+    if not wants_profile(headers, client):
+        yield
+        return
+
+    # busy قبل الـ rate limit: طلب ما انسجل له profile ما ياكل من حصة العميل
+    if not _ACTIVE.acquire(blocking=False):
+        state["profile_status"] = "busy"
+        yield
+        return
+
+    if not _allow(client["client_id"]):
+        _ACTIVE.release()
+        state["profile_status"] = "rate_limited"
+        yield
+        return
+
+    prof = cProfile.Profile()
+    try:
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+        # الـ route خلص ورجع response؛ أي خطأ في I/O هنا ما يغير نتيجة الطلب
+        try:
+            state["profile_id"] = _save(prof, client["client_id"], endpoint)
+            state["profile_status"] = "captured"
+        except Exception:
+            state["profile_status"] = "save_failed"
+    finally:
+        _ACTIVE.release()
+
+
+def list_profiles(client_id=None):
+    """
+    الأحدث أولاً.
+    """
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    rows = []
+    for name in os.listdir(PROFILE_DIR):
+        if not _SAFE_NAME.match(name):
+            continue
+        parts = name[:-len(".prof")].split("--")
+        if len(parts) != 4 or not parts[0].isdigit():
+            continue
+        if client_id and parts[1] != client_id:
+            continue
+        path = os.path.join(PROFILE_DIR, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        rows.append(({
+            "name": name,
+            "ts_ms": int(parts[0]),
+            "client_id": parts[1],
+            "endpoint": "/" + parts[2],
+            "bytes": st.st_size,
+        }, st.st_mtime_ns))
+    # نفس الـ ms؟ الـ mtime يفصل بينهم (الـ uuid في الاسم عشوائي)
+    rows.sort(key=lambda r: (r[0]["ts_ms"], r[1]), reverse=True)
+    return [row for row, _ in rows]
+
+
+def profile_path(name):
+    """
+    مسار ملف profile محفوظ، أو None لو الاسم غير صالح/مو موجود.
+    """
+    if not _SAFE_NAME.match(name or ""):
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    if not os.path.isfile(path):
+        return None
+    return os.path.abspath(path)
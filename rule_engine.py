@@ -0,0 +1,180 @@
+import threading
+import time
+from collections import defaultdict
+
+# ===============================
+# Declarative validation rules
+# ===============================
+# - Field: قيمة نحتاجها من الـ XML (path نسبي من الجذر، بدون .//)
+# - Rule: فحص يعلن الحقول اللي يحتاجها
+# - RuleSet: مجموعة rules تتحول (compile) لخطة استخراج واحدة = traversal واحد للشجرة
+
+
+class Field:
+    """
+    paths: tuple من المسارات البديلة، كل مسار tuple من tags بصيغة "cbc:Name".
+    many=False: أول نص غير فاضي (حسب ترتيب الوثيقة).  many=True: list بكل النصوص.
+    """
+
+    def __init__(self, name, *paths, many=False):
+        self.name = name
+        self.paths = paths
+        self.many = many
+
+    def default(self):
+        return [] if self.many else ""
+
+
+class Rule:
+    def __init__(self, rule_id, fields, check, severity="error", description=""):
+        self.id = rule_id
+        self.fields = tuple(fields)
+        self.check = check
+        self.severity = severity
+        self.description = description
+
+    def with_severity(self, severity):
+        return Rule(self.id, self.fields, self.check, severity, self.description)
+
+
+def rule(rule_id, fields, severity="error"):
+    """
+    Decorator: الدالة تاخذ dict القيم وترجع None أو رسالة (أو list رسائل).
+    """
+    def wrap(fn):
+        return Rule(rule_id, fields, fn, severity, (fn.__doc__ or "").strip())
+    return wrap
+
+
+# ===============================
+# Per-rule timing counters
+# ===============================
+# {rule_id: {"calls", "failures", "total_ns"}}
+RULE_STATS = defaultdict(lambda: {"calls": 0, "failures": 0, "total_ns": 0})
+_STATS_LOCK = threading.Lock()
+
+
+def _record(key, elapsed_ns, failed):
+    with _STATS_LOCK:
+        stats = RULE_STATS[key]
+        stats["calls"] += 1
+        stats["total_ns"] += elapsed_ns
+        if failed:
+            stats["failures"] += 1
+
+
+def rule_stats():
+    with _STATS_LOCK:
+        return {
+            key: dict(s, avg_us=round(s["total_ns"] / s["calls"] / 1000, 3) if s["calls"] else 0.0)
+            for key, s in RULE_STATS.items()
+        }
+
+
+def reset_rule_stats():
+    with _STATS_LOCK:
+        RULE_STATS.clear()
+
+
+# ===============================
+# Extraction plan
+# ===============================
+class _Node:
+    __slots__ = ("children", "fields")
+
+    def __init__(self):
+        self.children = {}   # clark tag -> _Node
+        self.fields = []     # fields اللي تنتهي عند هذا الـ node
+
+
+def _clark(tag, ns):
+    prefix, _, local = tag.partition(":")
+    return f"{{{ns[prefix]}}}{local}"
+
+
+def compile_plan(fields, ns):
+    """
+    يبني trie من كل مسارات الحقول؛ نمشي الشجرة مرة وحدة ونتبع بس الفروع اللي في الـ trie.
+    """
+    root = _Node()
+    for field in fields:
+        for path in field.paths:
+            node = root
+            for tag in path:
+                node = node.children.setdefault(_clark(tag, ns), _Node())
+            node.fields.append(field)
+    return root
+
+
+def extract(xml_root, plan, fields):
+    values = {f.name: f.default() for f in fields}
+
+    def walk(elem, node):
+        children = node.children
+        for child in elem:
+            sub = children.get(child.tag)
+            if sub is None:
+                continue
+            if sub.fields:
+                text = (child.text or "").strip()
+                for field in sub.fields:
+                    if field.many:
+                        values[field.name].append(text)
+                    elif text and not values[field.name]:
+                        values[field.name] = text
+            if sub.children:
+                walk(child, sub)
+
+    walk(xml_root, plan)
+    return values
+
+
+# ===============================
+# RuleSet
+# ===============================
+class RuleSet:
+    def __init__(self, name, version, rules, fields, ns):
+        self.name = name
+        self.version = f"{version}:{name}"
+        self.rules = list(rules)
+
+        needed = {fid for r in self.rules for fid in r.fields}
+        missing = needed - set(fields)
+        if missing:
+            raise ValueError(f"RuleSet '{name}' uses unknown fields: {sorted(missing)}")
+
+        self.fields = [fields[fid] for fid in sorted(needed)]
+        self.plan = compile_plan(self.fields, ns)
+
+    def evaluate(self, xml_root):
+        errors = []
+        warnings = []
+
+        t0 = time.perf_counter_ns()
+        values = extract(xml_root, self.plan, self.fields)
+        _record("__extract__", time.perf_counter_ns() - t0, False)
+
+        for r in self.rules:
+            t0 = time.perf_counter_ns()
+            result = r.check(values)
+            elapsed = time.perf_counter_ns() - t0
+
+            if not result:
+                _record(r.id, elapsed, False)
+                continue
+            _record(r.id, elapsed, True)
+
+            messages = [result] if isinstance(result, str) else list(result)
+            (errors if r.severity == "error" else warnings).extend(messages)
+
+        return errors, warnings
+
+    def describe(self):
+        return {
+            "name": self.name,
+            "version": self.version,
+            "rules": [
+                {"id": r.id, "severity": r.severity, "fields": list(r.fields), "description": r.description}
+                for r in self.rules
+            ],
+        }
@@ -1,6 +1,39 @@
 import os
-from signxml import XMLSigner, methods
-from lxml import etree
+
+# signxml / lxml / cryptography تقيلة في الـ import؛ نحملها أول ما نحتاجها بس
+# (workers اللي تخدم /validate_invoice بس ما تدفع التكلفة)
+_SIGNXML = None
+_KEYS = {}  # pem -> parsed private key
+
+
+def _signxml():
+    global _SIGNXML
+    if _SIGNXML is None:
+        from signxml import XMLSigner, methods
+        from lxml import etree
+        _SIGNXML = (XMLSigner, methods, etree)
+    return _SIGNXML
+
+
+def _private_key(pem: str):
+    # parse الـ PEM مرة وحدة بدل كل طلب
+    key = _KEYS.get(pem)
+    if key is None:
+        from cryptography.hazmat.primitives.serialization import load_pem_private_key
+        key = load_pem_private_key(pem.encode("utf-8"), password=None)
+        _KEYS.clear()
+        _KEYS[pem] = key
+    return key
+
+
+def warm_signer():
+    """
+    يحمل مكتبات التوقيع + المفتاح مسبقاً (gunicorn --preload: مرة وحدة في الـ master).
+    """
+    _signxml()
+    pem = os.environ.get("PRIVATE_KEY")
+    if pem:
+        _private_key(pem)
 
 
 def sign_xml(xml_input: str) -> str:
@@ -9,6 +42,8 @@ def sign_xml(xml_input: str) -> str:
     if not pem:
         raise RuntimeError("PRIVATE_KEY env var is not set")
 
+    XMLSigner, methods, etree = _signxml()
+
     # نحول الـ XML إلى عنصر
     root = etree.fromstring(xml_input.encode("utf-8"))
 
@@ -20,7 +55,7 @@ def sign_xml(xml_input: str) -> str:
 
     signed_root = signer.sign(
         root,
-        key=pem.encode("utf-8"),
+        key=_private_key(pem),
     )
 
     return etree.tostring(signed_root).decode("utf-8")
\ No newline at end of file
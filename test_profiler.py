@@ -0,0 +1,84 @@
+import pytest
+
+import profiler
+
+CLIENT = {"client_id": "cli_002", "features": {"profile"}}
+HEADERS = {"X-Profile": "1"}
+
+
+@pytest.fixture(autouse=True)
+def profiling(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiler, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(profiler, "PROFILE_DIR", str(tmp_path / "profiles"))
+    monkeypatch.setattr(profiler, "PROFILE_RATE_LIMIT", 2)
+    monkeypatch.setattr(profiler, "PROFILE_MAX_FILES", 3)
+    profiler.PROFILE_BUCKET.clear()
+    yield
+    profiler.PROFILE_BUCKET.clear()
+
+
+def _capture(client=CLIENT, endpoint="/sign_invoice"):
+    state = {}
+    with profiler.profile_request(HEADERS, client, endpoint, state):
+        sum(range(100))
+    return state
+
+
+def test_rate_limit_per_client():
+    assert _capture()["profile_status"] == "captured"
+    assert _capture()["profile_status"] == "captured"
+    assert _capture()["profile_status"] == "rate_limited"
+
+    other = {"client_id": "cli_003", "features": {"profile"}}
+    assert _capture(other)["profile_status"] == "captured"
+
+
+def test_busy_does_not_use_a_rate_limit_slot():
+    profiler._ACTIVE.acquire()
+    try:
+        for _ in range(5):
+            assert _capture()["profile_status"] == "busy"
+    finally:
+        profiler._ACTIVE.release()
+
+    assert _capture()["profile_status"] == "captured"
+    assert _capture()["profile_status"] == "captured"
+
+
+def test_ring_keeps_newest_and_just_saved(monkeypatch):
+    monkeypatch.setattr(profiler, "PROFILE_RATE_LIMIT", 100)
+    # نفس الـ ms لكل الـ captures: الأحدث لازم يبقى
+    monkeypatch.setattr(profiler.time, "time", lambda: 1700000000.0)
+
+    ids = [_capture()["profile_id"] for _ in range(6)]
+
+    names = [row["name"] for row in profiler.list_profiles()]
+    assert len(names) == 3
+    assert ids[-1] in names
+    assert profiler.profile_path(ids[-1])
+
+
+def test_save_failure_does_not_break_request(monkeypatch):
+    open(profiler.PROFILE_DIR, "w").close()
+
+    state = {}
+    with profiler.profile_request(HEADERS, CLIENT, "/sign_invoice", state):
+        result = "response"
+
+    assert result == "response"
+    assert state["profile_status"] == "save_failed"
+
+
+def test_download_only_own_profiles():
+    pytest.importorskip("flask")
+    import main
+
+    mine = _capture()["profile_id"]
+    theirs = _capture({"client_id": "cli_001", "features": {"profile"}})["profile_id"]
+
+    client = main.app.test_client()
+    headers = {"x-api-key": "client-key-456"}
+
+    assert client.get(f"/admin/profiles/{mine}", headers=headers).status_code == 200
+    assert client.get(f"/admin/profiles/{theirs}", headers=headers).status_code == 404
+    assert client.get("/admin/profiles/..%2Fmain.py", headers=headers).status_code == 404
@@ -0,0 +1,95 @@
+import sqlite3
+
+import validation_cache
+from invoice_builder import build_invoice_xml
+from validation_cache import ValidationCache, digest_bytes, validate_invoice_bytes
+from test_validator import INVOICE
+
+XML = build_invoice_xml(INVOICE).encode("utf-8")
+
+
+def _result(n):
+    return {"is_valid": True, "errors": [], "warnings": [f"w{n}"], "rule_set": "2:reporting"}
+
+
+def test_lru_eviction_and_counters():
+    cache = ValidationCache(size=2, path="")
+    cache.put("a", _result(1))
+    cache.put("b", _result(2))
+    assert cache.get("a")["warnings"] == ["w1"]   # a أحدث من b الحين
+
+    cache.put("c", _result(3))                    # يطرد b
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+    stats = cache.stats()
+    assert stats["size"] == 2
+    assert stats["evictions"] == 1
+    assert stats["hits_memory"] == 3
+    assert stats["misses"] == 1
+
+
+def test_returned_results_are_copies():
+    cache = ValidationCache(path="")
+
+    first, hit = validate_invoice_bytes(XML, cache)
+    assert not hit
+    first["errors"].append("poison")
+    first["is_valid"] = False
+
+    second, hit = validate_invoice_bytes(XML, cache)
+    assert hit
+    assert second["is_valid"]
+    assert second["errors"] == []
+
+    second["warnings"].append("poison")
+    assert validate_invoice_bytes(XML, cache)[0]["warnings"] == []
+
+
+def test_different_version_misses(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    key = digest_bytes(XML)
+
+    ValidationCache(path=path, version="v1").put(key, _result(1))
+
+    assert ValidationCache(path=path, version="v1").get(key) is not None
+    assert ValidationCache(path=path, version="v2").get(key) is None
+
+
+def test_disk_round_trip_between_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    writer = ValidationCache(path=path)
+    reader = ValidationCache(path=path)
+
+    result, hit = validate_invoice_bytes(XML, writer)
+    assert not hit
+
+    cached, hit = validate_invoice_bytes(XML, reader)
+    assert hit
+    assert cached == result
+    assert reader.stats()["hits_disk"] == 1
+    assert reader.stats()["hits_memory"] == 0
+
+
+def test_connect_error_is_a_miss_and_retried(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.sqlite3")
+    ValidationCache(path=path).put("k", _result(1))
+
+    real_connect = sqlite3.connect
+    calls = {"n": 0}
+
+    def flaky_connect(*args, **kwargs):
+        calls["n"] += 1
+        if calls["n"] == 1:
+            raise sqlite3.OperationalError("database is locked")
+        return real_connect(*args, **kwargs)
+
+    monkeypatch.setattr(validation_cache.sqlite3, "connect", flaky_connect)
+    monkeypatch.setattr(validation_cache, "_RETRY_AFTER", 0.0)
+
+    cache = ValidationCache(path=path)
+    assert cache.get("k") is None          # locked -> miss
+    assert cache.get("k") is not None      # المحاولة الثانية تفتح الـ DB
+    assert cache.stats()["disk"]
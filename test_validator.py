@@ -0,0 +1,72 @@
+import xml.etree.ElementTree as ET
+
+from invoice_builder import build_invoice_xml
+from validator import NS, validate_invoice_xml
+
+INVOICE = {
+    "InvoiceNumber": "INV-1001",
+    "UUID": "3cf5ee18-ee25-44ea-a444-2c37ba7f28be",
+    "IssueDate": "2024-01-15",
+    "Currency": "SAR",
+    "SellerName": "Mutabiq Trading Co.",
+    "SellerVAT": "300000000000003",
+    "BuyerName": "Acme Retail",
+    "BuyerVAT": "311111111100003",
+    "Items": [
+        {"Description": "A", "Quantity": 2, "UnitPrice": 100, "VATRate": 15},
+        {"Description": "B", "Quantity": 1, "UnitPrice": 250.5, "VATRate": 15},
+        {"Description": "C", "Quantity": 3, "UnitPrice": 19.99, "VATRate": 15},
+    ],
+}
+
+
+def _invoice(profile="reporting:1.0", drop_qr=False, **overrides):
+    root = ET.fromstring(build_invoice_xml(dict(INVOICE, **overrides)))
+    root.find("cbc:ProfileID", NS).text = profile
+    if drop_qr:
+        root.remove(root.find("cbc:EmbeddedDocumentBinaryObject", NS))
+    return ET.tostring(root, encoding="unicode")
+
+
+def test_multi_line_invoice_is_valid():
+    result = validate_invoice_xml(_invoice())
+
+    assert result["is_valid"], result["errors"]
+    assert result["errors"] == []
+    assert result["warnings"] == []
+    assert result["rule_set"].endswith(":reporting")
+
+
+def test_clearance_bad_issue_date_is_error():
+    result = validate_invoice_xml(_invoice("clearance:1.0", IssueDate="15/01/2024"))
+
+    assert not result["is_valid"]
+    assert "IssueDate 15/01/2024 must be in YYYY-MM-DD format." in result["errors"]
+    assert result["rule_set"].endswith(":clearance")
+
+
+def test_reporting_bad_issue_date_is_warning():
+    result = validate_invoice_xml(_invoice(IssueDate="15/01/2024"))
+
+    assert result["is_valid"], result["errors"]
+    assert "IssueDate 15/01/2024 must be in YYYY-MM-DD format." in result["warnings"]
+
+
+def test_missing_qr_only_warns_for_reporting():
+    qr_warning = "QR (EmbeddedDocumentBinaryObject) is missing or empty."
+
+    reporting = validate_invoice_xml(_invoice(drop_qr=True))
+    clearance = validate_invoice_xml(_invoice("clearance:1.0", drop_qr=True))
+
+    assert qr_warning in reporting["warnings"]
+    assert qr_warning not in clearance["warnings"]
+    assert clearance["is_valid"], clearance["errors"]
+
+
+def test_parse_error_has_same_shape():
+    result = validate_invoice_xml("<Invoice")
+
+    assert not result["is_valid"]
+    assert result["errors"][0].startswith("XML parse error:")
+    assert set(result) == {"is_valid", "errors", "warnings", "rule_set"}
+    assert result["rule_set"] is None
@@ -0,0 +1,231 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import rule_engine
+import validator
+from validator import RULES_VERSION, validate_invoice_xml
+
+# ===============================
+# CONFIG (env)
+# ===============================
+CACHE_SIZE = int(os.environ.get("VALIDATION_CACHE_SIZE", 1024))            # entries per process
+CACHE_DISK_SIZE = int(os.environ.get("VALIDATION_CACHE_DISK_SIZE", 20000))  # entries shared on disk
+# الـ disk tier opt-in: المسار لازم يكون داخل مجلد يملكه التطبيق بس (النتائج ترجع كما هي كـ verdict)
+# فاضي (الافتراضي) = memory بس
+CACHE_PATH = os.environ.get("VALIDATION_CACHE_PATH", "")
+
+_PRUNE_EVERY = 256
+_RETRY_AFTER = 5.0  # ثواني بعد فشل فتح الـ DB قبل ما نحاول مرة ثانية
+
+
+def _rules_fingerprint():
+    """
+    RULES_VERSION + hash لمصدر validator.py و rule_engine.py
+    (القواعد، الرسائل، الـ regex، EPS...)، عشان أي تعديل يبطل الكاش حتى لو نسينا نرفع الرقم.
+    """
+    h = hashlib.sha256()
+    for module in (validator, rule_engine):
+        with open(module.__file__, "rb") as f:
+            h.update(f.read())
+    return f"{RULES_VERSION}-{h.hexdigest()[:12]}"
+
+
+CACHE_VERSION = _rules_fingerprint()
+
+
+def digest_bytes(data) -> str:
+    # memoryview: ما ننسخ الـ body (bytes من request.get_data())
+    return hashlib.sha256(memoryview(data)).hexdigest()
+
+
+def _copy_result(result):
+    # الناتج dict بسيط؛ نرجع نسخة عشان محد يعدل على اللي في الكاش
+    out = dict(result)
+    for k in ("errors", "warnings"):
+        if k in out:
+            out[k] = list(out[k])
+    return out
+
+
+class ValidationCache:
+    """
+    LRU في الذاكرة + (اختياري) store محلي على القرص (sqlite) مشترك بين gunicorn workers.
+    المفتاح: sha256 للـ bytes، والـ version جزء من الـ lookup.
+    الـ lock يحمي الـ LRU بس؛ القرص يتقرا ويتكتب برا الـ lock بـ connection لكل thread.
+    """
+
+    def __init__(self, size=CACHE_SIZE, path=CACHE_PATH, disk_size=CACHE_DISK_SIZE, version=CACHE_VERSION):
+        self.size = size
+        self.path = path
+        self.disk_size = disk_size
+        self.version = version
+
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_pid = None   # الـ schema يتجهز مرة وحدة لكل process
+        self._retry_at = 0.0
+        self._puts = 0
+
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # -----------------------------
+    # disk tier
+    # -----------------------------
+    def _conn(self):
+        # connection لكل thread، وما ينفع يعبر fork (gunicorn --preload) فنفتح من جديد لو تغير الـ pid
+        if not self.path:
+            return None
+        pid = os.getpid()
+        db = getattr(self._local, "db", None)
+        if db is not None and self._local.pid == pid:
+            return db
+        if time.monotonic() < self._retry_at:
+            return None
+        db = None
+        try:
+            db = sqlite3.connect(self.path, timeout=2.0, isolation_level=None)
+            db.execute("PRAGMA synchronous=NORMAL")
+            if self._schema_pid != pid:
+                self._ensure_schema(db, pid)
+            self._local.db = db
+            self._local.pid = pid
+            return db
+        except sqlite3.Error:
+            # مثلاً "database is locked" وقت ما كل الـ workers يجهزون ملف جديد مع بعض:
+            # نعتبرها miss ونحاول بعدين، بدل ما نطفي الـ disk tier للأبد
+            if db is not None:
+                db.close()
+            self._retry_at = time.monotonic() + _RETRY_AFTER
+            return None
+
+    def _ensure_schema(self, db, pid):
+        with self._schema_lock:
+            if self._schema_pid == pid:
+                return
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS validation_cache ("
+                " key TEXT NOT NULL, version TEXT NOT NULL, result TEXT NOT NULL, last_access REAL NOT NULL,"
+                " PRIMARY KEY (key, version))"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS validation_cache_access ON validation_cache (last_access)")
+            self._schema_pid = pid
+
+    def _disk_get(self, key):
+        db = self._conn()
+        if db is None:
+            return None
+        try:
+            row = db.execute(
+                "SELECT result FROM validation_cache WHERE key = ? AND version = ?", (key, self.version)
+            ).fetchone()
+            # ما نحدث last_access على القراءة (write lock لكل hit)؛ الـ prune يعتمد على وقت الكتابة
+            return json.loads(row[0]) if row else None
+        except (sqlite3.Error, ValueError):
+            return None
+
+    def _disk_put(self, key, result, prune):
+        db = self._conn()
+        if db is None:
+            return
+        try:
+            db.execute(
+                "INSERT OR REPLACE INTO validation_cache (key, version, result, last_access) VALUES (?, ?, ?, ?)",
+                (key, self.version, json.dumps(result, ensure_ascii=False), time.time())
+            )
+            if prune:
+                db.execute(
+                    "DELETE FROM validation_cache WHERE rowid IN ("
+                    " SELECT rowid FROM validation_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                    (self.disk_size,)
+                )
+        except sqlite3.Error:
+            pass
+
+    # -----------------------------
+    # public
+    # -----------------------------
+    def get(self, key):
+        with self._lock:
+            result = self._lru.get(key)
+            if result is not None:
+                self._lru.move_to_end(key)
+                self.hits_memory += 1
+                return _copy_result(result)
+
+        result = self._disk_get(key)
+
+        with self._lock:
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits_disk += 1
+            self._remember(key, result)
+            return _copy_result(result)
+
+    def put(self, key, result):
+        with self._lock:
+            self._remember(key, _copy_result(result))
+            self._puts += 1
+            prune = self._puts % _PRUNE_EVERY == 0
+        self._disk_put(key, result, prune)
+
+    def _remember(self, key, result):
+        self._lru[key] = result
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.size:
+            self._lru.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+        db = self._conn()
+        if db is not None:
+            try:
+                db.execute("DELETE FROM validation_cache")
+            except sqlite3.Error:
+                pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits_memory + self.hits_disk + self.misses
+            return {
+                "version": self.version,
+                "size": len(self._lru),
+                "max_size": self.size,
+                "disk": bool(self.path),
+                "hits_memory": self.hits_memory,
+                "hits_disk": self.hits_disk,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits_memory + self.hits_disk) / lookups, 4) if lookups else 0.0,
+            }
+
+
+VALIDATION_CACHE = ValidationCache()
+
+
+def validate_invoice_bytes(data: bytes, cache=VALIDATION_CACHE):
+    """
+    validate_invoice_xml مع memoization على sha256 للـ body.
+    يرجع (result, cache_hit).
+    """
+    key = digest_bytes(data)
+    result = cache.get(key)
+    if result is not None:
+        return result, True
+
+    result = validate_invoice_xml(data.decode("utf-8"))
+    cache.put(key, result)
+    return result, False
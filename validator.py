@@ -1,10 +1,16 @@
+import re
 import xml.etree.ElementTree as ET
 
+from rule_engine import Field, RuleSet, rule
+
 NS = {
     "cbc": "urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2",
     "cac": "urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2",
 }
 
+# أي تعديل على القواعد أو الرسائل لازم يرفع الرقم (يُستخدم كمفتاح للـ caching)
+RULES_VERSION = "2"
+
 def _to_float(value, default=0.0):
     try:
         if value is None:
@@ -13,20 +19,157 @@ def _to_float(value, default=0.0):
     except (ValueError, TypeError):
         return default
 
-def _get_text(root, path: str) -> str:
-    el = root.find(path, NS)
-    if el is not None and el.text:
-        return el.text.strip()
-    return ""
+# -----------------------------
+# الحقول (مسارات من جذر الـ Invoice)
+# -----------------------------
+_SUPPLIER = ("cac:AccountingSupplierParty", "cac:Party")
+_CUSTOMER = ("cac:AccountingCustomerParty", "cac:Party")
+_LINE = ("cac:InvoiceLine",)
+
+FIELDS = {f.name: f for f in [
+    Field("profile_id", ("cbc:ProfileID",)),
+    Field("invoice_id", ("cbc:ID",)),
+    Field("uuid", ("cbc:UUID",)),
+    Field("issue_date", ("cbc:IssueDate",)),
+    Field("currency", ("cbc:DocumentCurrencyCode",)),
+
+    Field("seller_name", _SUPPLIER + ("cbc:Name",)),
+    Field("seller_vat", _SUPPLIER + ("cac:PartyTaxScheme", "cbc:CompanyID")),
+    Field("buyer_name", _CUSTOMER + ("cbc:Name",)),
+    Field("buyer_vat", _CUSTOMER + ("cac:PartyTaxScheme", "cbc:CompanyID")),
+
+    Field("tax_total", ("cac:TaxTotal", "cbc:TaxAmount")),
+    Field("subtotal", ("cac:LegalMonetaryTotal", "cbc:LineExtensionAmount")),
+    Field("tax_inclusive", ("cac:LegalMonetaryTotal", "cbc:TaxInclusiveAmount")),
+
+    Field("lines", _LINE, many=True),
+    Field("line_amounts", _LINE + ("cbc:LineExtensionAmount",), many=True),
+    Field("line_vats", _LINE + ("cac:TaxTotal", "cac:TaxSubtotal", "cbc:TaxAmount"), many=True),
+
+    # QR: مباشرة تحت الجذر (invoice_builder) أو داخل AdditionalDocumentReference (UBL القياسي)
+    Field(
+        "qr",
+        ("cbc:EmbeddedDocumentBinaryObject",),
+        ("cac:AdditionalDocumentReference", "cac:Attachment", "cbc:EmbeddedDocumentBinaryObject"),
+    ),
+]}
+
+# -----------------------------
+# القواعد
+# -----------------------------
+def _required(rule_id, field, label):
+    r = rule(rule_id, (field,))(lambda v: None if v[field] else f"Missing {label}.")
+    r.description = f"{label} is present."
+    return r
+
+BR_01 = _required("BR-01", "profile_id", "ProfileID")
+BR_02 = _required("BR-02", "invoice_id", "Invoice ID")
+BR_KSA_03 = _required("BR-KSA-03", "uuid", "UUID")
+BR_03 = _required("BR-03", "issue_date", "IssueDate")
+BR_05 = _required("BR-05", "currency", "DocumentCurrencyCode")
+BR_06 = _required("BR-06", "seller_name", "seller name")
+BR_KSA_39 = _required("BR-KSA-39", "seller_vat", "seller VAT (CompanyID)")
+BR_07 = _required("BR-07", "buyer_name", "buyer name")
+BR_KSA_42 = _required("BR-KSA-42", "buyer_vat", "buyer VAT (CompanyID)")
+
+_VAT_NUMBER = re.compile(r"^3\d{13}3$")
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+EPS = 0.01
+
+@rule("BR-KSA-40", ("seller_vat",))
+def BR_KSA_40(v):
+    """Seller VAT number is 15 digits, first and last digit 3."""
+    if v["seller_vat"] and not _VAT_NUMBER.match(v["seller_vat"]):
+        return f"Seller VAT {v['seller_vat']} must be 15 digits starting and ending with 3."
+
+@rule("BR-KSA-44", ("buyer_vat",))
+def BR_KSA_44(v):
+    """Buyer VAT number, when present, is 15 digits, first and last digit 3."""
+    if v["buyer_vat"] and not _VAT_NUMBER.match(v["buyer_vat"]):
+        return f"Buyer VAT {v['buyer_vat']} must be 15 digits starting and ending with 3."
+
+@rule("BR-KSA-F-04", ("issue_date",))
+def BR_KSA_F_04(v):
+    """IssueDate uses YYYY-MM-DD."""
+    if v["issue_date"] and not _ISO_DATE.match(v["issue_date"]):
+        return f"IssueDate {v['issue_date']} must be in YYYY-MM-DD format."
+
+@rule("BR-CO-10", ("lines", "line_amounts", "subtotal"))
+def BR_CO_10(v):
+    """Header LineExtensionAmount equals the sum of line net amounts."""
+    if not v["lines"]:
+        return None
+    subtotal_header = _to_float(v["subtotal"], 0.0)
+    sum_lines_subtotal = sum(_to_float(x, 0.0) for x in v["line_amounts"])
+    if abs(sum_lines_subtotal - subtotal_header) > EPS:
+        return f"Header subtotal {subtotal_header} != sum of lines {sum_lines_subtotal}"
+
+@rule("BR-CO-14", ("lines", "line_vats", "tax_total"))
+def BR_CO_14(v):
+    """Header TaxAmount equals the sum of line VAT amounts."""
+    if not v["lines"]:
+        return None
+    tax_total_header = _to_float(v["tax_total"], 0.0)
+    sum_lines_vat = sum(_to_float(x, 0.0) for x in v["line_vats"])
+    if abs(sum_lines_vat - tax_total_header) > EPS:
+        return f"Header VAT {tax_total_header} != sum of lines VAT {sum_lines_vat}"
+
+@rule("BR-CO-15", ("lines", "line_amounts", "line_vats", "tax_inclusive"))
+def BR_CO_15(v):
+    """Header TaxInclusiveAmount equals line net plus line VAT."""
+    if not v["lines"]:
+        return None
+    tax_inclusive_header = _to_float(v["tax_inclusive"], 0.0)
+    expected_total = round(
+        sum(_to_float(x, 0.0) for x in v["line_amounts"]) + sum(_to_float(x, 0.0) for x in v["line_vats"]),
+        2
+    )
+    if abs(expected_total - tax_inclusive_header) > EPS:
+        return f"Header TaxInclusive {tax_inclusive_header} != expected {expected_total}"
+
+@rule("BR-KSA-27", ("qr",), severity="warning")
+def BR_KSA_27(v):
+    """Simplified (reporting) invoices carry a QR code."""
+    if not v["qr"]:
+        return "QR (EmbeddedDocumentBinaryObject) is missing or empty."
+
+# -----------------------------
+# Rule sets حسب ProfileID
+# -----------------------------
+_CORE_RULES = [
+    BR_01, BR_02, BR_KSA_03, BR_03, BR_05,
+    BR_06, BR_KSA_39, BR_07, BR_KSA_42,
+    BR_CO_10, BR_CO_14, BR_CO_15,
+]
+
+RULE_SETS = {
+    # reporting: قواعد الصيغة الجديدة تحذيرات بس عشان ما نكسر العملاء الحاليين
+    "reporting": RuleSet("reporting", RULES_VERSION, _CORE_RULES + [
+        BR_KSA_40.with_severity("warning"),
+        BR_KSA_44.with_severity("warning"),
+        BR_KSA_F_04.with_severity("warning"),
+        BR_KSA_27,
+    ], FIELDS, NS),
+
+    # clearance: الصيغة errors، والـ QR تضيفه ZATCA بعد الـ clearance
+    "clearance": RuleSet("clearance", RULES_VERSION, _CORE_RULES + [
+        BR_KSA_40,
+        BR_KSA_44,
+        BR_KSA_F_04,
+    ], FIELDS, NS),
+}
+DEFAULT_RULE_SET = "reporting"
+
+def select_rule_set(profile_id: str) -> RuleSet:
+    # "clearance:1.0" -> clearance ، أي شي ثاني -> reporting
+    key = (profile_id or "").split(":", 1)[0].strip().lower()
+    return RULE_SETS.get(key, RULE_SETS[DEFAULT_RULE_SET])
 
 def validate_invoice_xml(xml_str: str):
     """
     يفحص فاتورة UBL XML بعد البناء + بعد التوقيع.
     """
 
-    errors = []
-    warnings = []
-
     # -----------------------------
     # 1) Parse XML
     # -----------------------------
@@ -36,98 +179,23 @@ def validate_invoice_xml(xml_str: str):
         return {
             "is_valid": False,
             "errors": [f"XML parse error: {str(e)}"],
-            "warnings": []
+            "warnings": [],
+            # ما وصلنا للـ ProfileID، فما فيه rule set اشتغل
+            "rule_set": None
         }
 
     # -----------------------------
-    # 2) التحقق من الحقول الأساسية
-    # -----------------------------
-    required_fields = {
-        "ProfileID": ".//cbc:ProfileID",
-        "Invoice ID": ".//cbc:ID",
-        "UUID": ".//cbc:UUID",
-        "IssueDate": ".//cbc:IssueDate",
-        "DocumentCurrencyCode": ".//cbc:DocumentCurrencyCode"
-    }
-
-    for label, path in required_fields.items():
-        if not _get_text(root, path):
-            errors.append(f"Missing {label}.")
-
-    # -----------------------------
-    # 3) البائع Buyer / Seller
-    # -----------------------------
-    seller_name = _get_text(root, ".//cac:AccountingSupplierParty/cac:Party/cbc:Name")
-    seller_vat = _get_text(root, ".//cac:AccountingSupplierParty/cac:Party/cac:PartyTaxScheme/cbc:CompanyID")
-
-    buyer_name = _get_text(root, ".//cac:AccountingCustomerParty/cac:Party/cbc:Name")
-    buyer_vat = _get_text(root, ".//cac:AccountingCustomerParty/cac:Party/cac:PartyTaxScheme/cbc:CompanyID")
-
-    if not seller_name:
-        errors.append("Missing seller name.")
-    if not seller_vat:
-        errors.append("Missing seller VAT (CompanyID).")
-    if not buyer_name:
-        errors.append("Missing buyer name.")
-    if not buyer_vat:
-        errors.append("Missing buyer VAT (CompanyID).")
-
-    # -----------------------------
-    # 4) المجاميع في الـ Header
-    # -----------------------------
-    tax_total_header = _to_float(_get_text(root, ".//cac:TaxTotal/cbc:TaxAmount"), 0.0)
-    subtotal_header = _to_float(_get_text(root, ".//cac:LegalMonetaryTotal/cbc:LineExtensionAmount"), 0.0)
-    tax_inclusive_header = _to_float(_get_text(root, ".//cac:LegalMonetaryTotal/cbc:TaxInclusiveAmount"), 0.0)
-
-    # -----------------------------
-    # 5) قراءة سطور الفاتورة
-    # -----------------------------
-    lines = root.findall(".//cac:InvoiceLine", NS)
-
-    sum_lines_subtotal = 0.0
-    sum_lines_vat = 0.0
-
-    for line in lines:
-        line_sub = _to_float(_get_text(line, "./cbc:LineExtensionAmount"), 0.0)
-        sum_lines_subtotal += line_sub
-
-        line_vat = _to_float(
-            _get_text(line, "./cac:TaxTotal/cac:TaxSubtotal/cbc:TaxAmount"),
-            0.0
-        )
-        sum_lines_vat += line_vat
-
-    EPS = 0.01
-
-    if lines:
-        if abs(sum_lines_subtotal - subtotal_header) > EPS:
-            errors.append(
-                f"Header subtotal {subtotal_header} != sum of lines {sum_lines_subtotal}"
-            )
-
-        if abs(sum_lines_vat - tax_total_header) > EPS:
-            errors.append(
-                f"Header VAT {tax_total_header} != sum of lines VAT {sum_lines_vat}"
-            )
-
-        expected_total = round(sum_lines_subtotal + sum_lines_vat, 2)
-        if abs(expected_total - tax_inclusive_header) > EPS:
-            errors.append(
-                f"Header TaxInclusive {tax_inclusive_header} != expected {expected_total}"
-            )
-
-    # -----------------------------
-    # 6) QR موجود أو لا؟
+    # 2) اختيار الـ rule set + تشغيله (traversal واحد)
     # -----------------------------
-    qr_node = root.find(".//cbc:EmbeddedDocumentBinaryObject", NS)
-    if qr_node is None or not (qr_node.text or "").strip():
-        warnings.append("QR (EmbeddedDocumentBinaryObject) is missing or empty.")
+    rule_set = select_rule_set(root.findtext("cbc:ProfileID", "", NS).strip())
+    errors, warnings = rule_set.evaluate(root)
 
     # -----------------------------
-    # 7) الناتج
+    # 3) الناتج
     # -----------------------------
     return {
         "is_valid": len(errors) == 0,
         "errors": errors,
-        "warnings": warnings
+        "warnings": warnings,
+        "rule_set": rule_set.version
     }